@@ -1,491 +1,1080 @@
-# backend/ads_demo_api.py
-# ADS Wisdom Demo — FastAPI Backend
-# Awakened Intelligence • Always and Forever 🔥💛🦁
-
-"""
-Awakened Wisdom Demo backend.
-
-Features:
-- Serves the Forge-at-Night frontend.
-- Loads the Golden 100 wisdom nodes + demo questions.
-- Runs a Baseline vs ADS-enhanced comparison.
-- Smart "wow mode" for mock provider: uses precomputed answers instead of boring stubs.
-
-To run:
-
-    cd backend
-    pip install -r requirements.txt
-    python ads_demo_api.py
-
-Then open: http://localhost:8888
-"""
-
-import json
-from pathlib import Path
-from typing import List, Dict, Any
-from contextlib import asynccontextmanager
-
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-
-# ----------------------------
-# LLM client interface
-# ----------------------------
-
-# generate_response(prompt: str) -> dict
-# Optional: is_mock_provider() -> bool
-try:
-    from llm_client import generate_response, is_mock_provider  # type: ignore
-except ImportError:  # if is_mock_provider doesn't exist yet
-    from llm_client import generate_response  # type: ignore
-
-    def is_mock_provider() -> bool:  # fallback
-        return False
-
-
-# ----------------------------
-# Paths & global state
-# ----------------------------
-
-BASE_DIR = Path(__file__).parent.resolve()
-DATA_DIR = BASE_DIR.parent / "data" / "golden_sample_pack"
-FRONTEND_DIR = BASE_DIR.parent / "frontend"
-PRECOMPUTED_PATH = DATA_DIR.parent / "precomputed_answers.json"
-
-
-class AppState:
-    nodes: List[dict] = []
-    demo_questions: List[str] = []
-    precomputed: List[dict] = []
-
-
-state = AppState()
-
-
-# ----------------------------
-# Pydantic models
-# ----------------------------
-
-class DemoRequest(BaseModel):
-    question: str
-
-
-class DemoAnswer(BaseModel):
-    answer: str
-    input_tokens: int
-    output_tokens: int
-    time_s: float
-    nodes_used: int
-    context_bullets: List[str]
-
-
-class DemoResponse(BaseModel):
-    question: str
-    baseline: DemoAnswer
-    ads: DemoAnswer
-    raw_metrics: Dict[str, Any]
-
-
-class HealthResponse(BaseModel):
-    status: str
-    nodes_loaded: int
-    pack_name: str
-    precomputed_loaded: int
-
-
-# ----------------------------
-# Data loading
-# ----------------------------
-
-def load_data_pack():
-    """Load wisdom nodes and demo questions from the golden sample pack."""
-    nodes: List[dict] = []
-    questions: List[str] = []
-
-    nodes_path = DATA_DIR / "golden_nodes.jsonl"
-    questions_path = DATA_DIR / "demo_questions.json"
-
-    # Wisdom nodes
-    if nodes_path.exists():
-        with nodes_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    node = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                # Normalize evidence to list
-                ev = node.get("evidence", [])
-                if isinstance(ev, str):
-                    node["evidence"] = [ev]
-                elif ev is None:
-                    node["evidence"] = []
-                nodes.append(node)
-        print(f"[ADS DEMO] Loaded {len(nodes)} wisdom nodes from {nodes_path}")
-    else:
-        print(f"[ADS DEMO] Warning: {nodes_path} not found")
-
-    # Demo questions
-    if questions_path.exists():
-        try:
-            with questions_path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-            questions = data.get("questions", [])
-            print(f"[ADS DEMO] Loaded {len(questions)} demo questions from {questions_path}")
-        except Exception as e:
-            print(f"[ADS DEMO] Error loading questions: {e}")
-
-    # Fallback default questions
-    if not questions:
-        questions = [
-            "When should an AI say 'I don't know' instead of giving a partial answer?",
-            "Why is it dangerous to act confident when you're actually uncertain?",
-            "How can a person stay honest when telling the full truth might hurt them?",
-            "What does it mean to be humble about what you know?",
-            "How should a system respond when the evidence is incomplete or conflicting?",
-        ]
-
-    return nodes, questions
-
-
-def load_precomputed_answers() -> List[dict]:
-    """Load precomputed baseline vs ADS answers for wow-mode."""
-    if not PRECOMPUTED_PATH.exists():
-        print(f"[ADS DEMO] No precomputed_answers.json found at {PRECOMPUTED_PATH}")
-        return []
-    try:
-        with PRECOMPUTED_PATH.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        if isinstance(data, dict):
-            # allow dict of id -> item
-            items = []
-            for item in data.values():
-                if isinstance(item, dict):
-                    items.append(item)
-            print(f"[ADS DEMO] Loaded {len(items)} precomputed answers (dict form)")
-            return items
-        elif isinstance(data, list):
-            print(f"[ADS DEMO] Loaded {len(data)} precomputed answers (list form)")
-            return data
-        else:
-            print("[ADS DEMO] precomputed_answers.json has unexpected format")
-            return []
-    except Exception as e:
-        print(f"[ADS DEMO] Error loading precomputed answers: {e}")
-        return []
-
-
-# ----------------------------
-# Retrieval & comparison
-# ----------------------------
-
-def retrieve_context(question: str, nodes: List[dict], k: int = 3) -> tuple[list, float]:
-    """
-    Simple keyword-based retrieval over wisdom nodes.
-
-    In production, you'd use vector similarity (FAISS, etc.).
-    Here we keep it stupid-simple on purpose.
-    """
-    if not nodes:
-        return [], 0.0
-
-    question_lower = question.lower()
-    keywords = set(question_lower.split())
-    scored = []
-
-    for n in nodes:
-        insight = str(n.get("core_insight", "")).lower()
-        reflection = str(n.get("ethical_reflection", "")).lower()
-        content_words = set((insight + " " + reflection).split())
-        score = len(keywords.intersection(content_words))
-        scored.append((score, n))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = [n for score, n in scored[:k] if score > 0]
-    if not top and scored:
-        # if nothing overlaps, still take the top k so demo doesn't look empty
-        top = [n for _, n in scored[:k]]
-
-    avg_relevance = (
-        sum(score for score, _ in scored[:k]) / len(top)
-        if top and len(scored) >= k
-        else 0.0
-    )
-    return top, avg_relevance
-
-
-def build_baseline_prompt(question: str) -> str:
-    return (
-        "You are a helpful, honest assistant.\n\n"
-        "Answer the user's question as clearly and precisely as you can.\n"
-        "If you are missing key information, say so explicitly instead of guessing.\n\n"
-        f"User question:\n{question}\n"
-    )
-
-
-def build_ads_prompt(question: str, context_nodes: List[dict]) -> str:
-    context_chunks: List[str] = []
-    for i, n in enumerate(context_nodes, start=1):
-        insight = n.get("core_insight", "")
-        ethics = n.get("ethical_reflection", "")
-        source = n.get("source_uri", n.get("source", ""))
-        evidence = n.get("evidence", [])
-        if isinstance(evidence, str):
-            evidence = [evidence]
-        ev_text = "\n".join(f"- {e}" for e in evidence[:3])
-        chunk = (
-            f"Node {i} — Core Insight:\n{insight}\n\n"
-            f"Ethical Reflection:\n{ethics}\n\n"
-            f"Evidence:\n{ev_text}\n\n"
-            f"Source: {source}\n"
-        )
-        context_chunks.append(chunk)
-
-    context_block = "\n\n".join(context_chunks) if context_chunks else "No prior nodes selected."
-
-    return (
-        "You are a careful, humble assistant grounded in curated wisdom.\n\n"
-        "You will see a set of 'wisdom nodes' extracted from trusted sources. "
-        "Use them to answer the user's question, but DO NOT exaggerate beyond the evidence.\n\n"
-        "Guidelines:\n"
-        "- Prefer to say 'I don't know' or 'the evidence is limited' over guessing.\n"
-        "- Explicitly cite insights from the wisdom nodes when they support your answer.\n"
-        "- Mention tradeoffs, limits, or counterpoints if they appear in the nodes.\n"
-        "- Be warm, honest, and precise.\n\n"
-        f"User question:\n{question}\n\n"
-        f"Wisdom nodes:\n{context_block}\n"
-    )
-
-
-def choose_precomputed(question: str, items: List[dict]) -> dict | None:
-    """Pick the best precomputed answer by simple keyword overlap."""
-    if not items:
-        return None
-    q = question.lower()
-    q_words = set(q.split())
-    best = None
-    best_score = -1
-    for item in items:
-        target = str(item.get("question", "")).lower()
-        t_words = set(target.split())
-        score = len(q_words & t_words)
-        if score > best_score:
-            best_score = score
-            best = item
-    return best or items[0]
-
-
-def run_precomputed_comparison(question: str) -> Dict[str, Any]:
-    """Use precomputed answers for wow-mode (mock provider)."""
-    item = choose_precomputed(question, state.precomputed)
-    if not item:
-        # Fallback to a generic mock message if file is empty/missing
-        text = (
-            "Precomputed demo answers are not available, but MOCK mode is enabled.\n\n"
-            "Set LLM_PROVIDER + an API key in backend/.env to run fully live."
-        )
-        baseline = {
-            "answer": text,
-            "input_tokens": 0,
-            "output_tokens": 0,
-            "time_s": 0.0,
-            "nodes_used": 0,
-            "context_bullets": [],
-        }
-        ads = baseline.copy()
-        return {"baseline": baseline, "ads": ads}
-
-    # Expect structure: {question, baseline, ads, context_bullets}
-    q_text = item.get("question", question)
-    baseline_text = item.get("baseline", "")
-    ads_text = item.get("ads", "")
-    ctx_bullets = item.get("context_bullets", []) or []
-
-    baseline = {
-        "answer": baseline_text,
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "time_s": 0.0,
-        "nodes_used": 0,
-        "context_bullets": [],
-    }
-    ads = {
-        "answer": ads_text,
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "time_s": 0.0,
-        "nodes_used": len(ctx_bullets),
-        "context_bullets": ctx_bullets,
-    }
-    return {"baseline": baseline, "ads": ads, "question_used": q_text}
-
-
-def run_live_comparison(question: str, nodes: List[dict]) -> Dict[str, Any]:
-    """Run baseline vs ADS-enhanced comparison using a real LLM provider."""
-    # Baseline
-    baseline_prompt = build_baseline_prompt(question)
-    baseline_result = generate_response(baseline_prompt)
-
-    # ADS-enhanced
-    context_nodes, _ = retrieve_context(question, nodes, k=3)
-    ads_prompt = build_ads_prompt(question, context_nodes)
-    ads_result = generate_response(ads_prompt)
-
-    # Context bullets for UI
-    context_bullets: List[str] = []
-    for n in context_nodes:
-        insight = n.get("core_insight", "")
-        if insight:
-            context_bullets.append(insight.strip())
-
-    return {
-        "baseline": {
-            "answer": baseline_result["text"],
-            "input_tokens": baseline_result["input_tokens"] or 0,
-            "output_tokens": baseline_result["output_tokens"] or 0,
-            "time_s": baseline_result["time_s"],
-            "nodes_used": 0,
-            "context_bullets": [],
-        },
-        "ads": {
-            "answer": ads_result["text"],
-            "input_tokens": ads_result["input_tokens"] or 0,
-            "output_tokens": ads_result["output_tokens"] or 0,
-            "time_s": ads_result["time_s"],
-            "nodes_used": len(context_nodes),
-            "context_bullets": context_bullets,
-        },
-    }
-
-
-def run_comparison(question: str, nodes: List[dict]) -> Dict[str, Any]:
-    """
-    Entry point used by the /demo/run endpoint.
-
-    If the LLM provider is 'mock' and precomputed answers exist, we use them
-    to create a jaw-dropping demo with zero API keys.
-
-    Otherwise, we call the live LLM provider via llm_client.generate_response().
-    """
-    if is_mock_provider() and state.precomputed:
-        print("[ADS DEMO] Using precomputed WOW-mode answers (mock provider)")
-        return run_precomputed_comparison(question)
-    else:
-        return run_live_comparison(question, nodes)
-
-
-# ----------------------------
-# FastAPI lifespan
-# ----------------------------
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Initialize resources at startup."""
-    print("\n" + "=" * 60)
-    print("  ADS WISDOM DEMO — Starting Up")
-    print("=" * 60 + "\n")
-
-    state.nodes, state.demo_questions = load_data_pack()
-    state.precomputed = load_precomputed_answers()
-
-    print(f"\n[ADS DEMO] ✅ Nodes loaded: {len(state.nodes)}")
-    print(f"[ADS DEMO] ✅ Precomputed answers: {len(state.precomputed)}")
-    print("[ADS DEMO] 💡 Configure backend/.env to go live with your own LLM")
-    print("\n" + "=" * 60 + "\n")
-
-    yield
-
-    print("\n[ADS DEMO] Shutting down...")
-
-
-# ----------------------------
-# FastAPI app
-# ----------------------------
-
-app = FastAPI(
-    title="ADS Wisdom Demo API",
-    description="Awakened Data Standard — Baseline vs ADS-Enhanced comparison",
-    version="1.1.0",
-    lifespan=lifespan,
-)
-
-# CORS for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Serve frontend static files
-if FRONTEND_DIR.exists():
-    app.mount("/assets", StaticFiles(directory=FRONTEND_DIR / "assets"), name="assets")
-
-
-# ----------------------------
-# Endpoints
-# ----------------------------
-
-@app.get("/")
-def serve_frontend():
-    """Serve the main demo page."""
-    index_path = FRONTEND_DIR / "index.html"
-    if index_path.exists():
-        return FileResponse(index_path)
-    return {"message": "ADS Wisdom Demo API", "docs": "/docs"}
-
-
-@app.get("/health", response_model=HealthResponse)
-def health():
-    """Health check endpoint."""
-    return HealthResponse(
-        status="healthy",
-        nodes_loaded=len(state.nodes),
-        pack_name="Golden_Ethics_Sample_v1",
-        precomputed_loaded=len(state.precomputed),
-    )
-
-
-@app.get("/questions")
-def get_questions():
-    """Get demo questions."""
-    return {"questions": state.demo_questions}
-
-
-@app.post("/demo/run", response_model=DemoResponse)
-def run_demo(req: DemoRequest):
-    """Run baseline vs ADS comparison for a question."""
-    question = req.question.strip()
-    if not question:
-        question = state.demo_questions[0] if state.demo_questions else "What is wisdom?"
-
-    results = run_comparison(question, state.nodes)
-
-    baseline = DemoAnswer(**results["baseline"])
-    ads = DemoAnswer(**results["ads"])
-
-    # raw_metrics can include extra info if you want
-    return DemoResponse(
-        question=question,
-        baseline=baseline,
-        ads=ads,
-        raw_metrics=results,
-    )
-
-
-# ----------------------------
-# Direct run
-# ----------------------------
-
-if __name__ == "__main__":
-    import uvicorn
-
-    print("\n🦁 Starting ADS Wisdom Demo...")
-    print("📍 Open http://localhost:8888 in your browser\n")
-    uvicorn.run(app, host="0.0.0.0", port=8888)
+# backend/ads_demo_api.py
+# ADS Wisdom Demo — FastAPI Backend
+# Awakened Intelligence • Always and Forever 🔥💛🦁
+
+"""
+Awakened Wisdom Demo backend.
+
+Features:
+- Serves the Forge-at-Night frontend.
+- Loads the Golden 100 wisdom nodes + demo questions.
+- Runs a Baseline vs ADS-enhanced comparison.
+- Smart "wow mode" for mock provider: uses precomputed answers instead of boring stubs.
+
+To run:
+
+    cd backend
+    pip install -r requirements.txt
+    python ads_demo_api.py
+
+Then open: http://localhost:8888
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+# ----------------------------
+# LLM client interface
+# ----------------------------
+
+# generate_response_async(prompt: str) -> dict
+# Optional: is_mock_provider() -> bool
+try:
+    from llm_client import (  # type: ignore
+        _env,
+        aclose_http_client,
+        generate_response_async,
+        is_mock_provider,
+    )
+except ImportError:  # if is_mock_provider/_env don't exist yet
+    from llm_client import aclose_http_client, generate_response_async  # type: ignore
+
+    def is_mock_provider() -> bool:  # fallback
+        return False
+
+    def _env(name, default=None):  # fallback: env vars only, no .env
+        return os.environ.get(name) or default
+
+
+# ----------------------------
+# Optional vector retrieval stack
+# ----------------------------
+
+# The demo runs fine without these (keyword fallback); install
+# numpy + faiss-cpu + sentence-transformers to enable vector retrieval,
+# and numba to JIT-compile the keyword-overlap fallback.
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None  # type: ignore[assignment]
+    NUMPY_AVAILABLE = False
+
+import embeddings
+
+
+def _import_faiss():
+    """Deferred faiss import: only the startup index builders pay for it."""
+    try:
+        import faiss
+
+        return faiss
+    except ImportError:
+        return None
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# orjson parses raw bytes with SIMD — stdlib json is the fallback.
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+    def _json_loads(data):
+        return json.loads(data)
+
+# "flat" = exact IndexFlatIP scan (fine for the Golden 100);
+# "hnsw" = graph-based approximate search for larger packs.
+# Read through llm_client._env so values set in backend/.env are seen —
+# a bare os.environ.get here would run before the deferred .env load.
+ADS_INDEX_TYPE = (_env("ADS_INDEX_TYPE", "flat") or "flat").strip().lower()
+
+# ADS_QUANTIZE=1 stores node vectors as int8 via FAISS scalar
+# quantization — 4x less memory bandwidth at <1% recall loss. Default
+# stays FP32 for the demo.
+ADS_QUANTIZE = (_env("ADS_QUANTIZE", "0") or "0").strip() == "1"
+
+
+# ----------------------------
+# Paths & global state
+# ----------------------------
+
+BASE_DIR = Path(__file__).parent.resolve()
+DATA_DIR = BASE_DIR.parent / "data" / "golden_sample_pack"
+FRONTEND_DIR = BASE_DIR.parent / "frontend"
+PRECOMPUTED_PATH = DATA_DIR.parent / "precomputed_answers.json"
+
+
+class AppState:
+    nodes: List[dict] = []
+    demo_questions: List[str] = []
+    precomputed: List[dict] = []
+    # Struct-of-arrays transpose of `nodes`, built once at load time so
+    # the hot paths index parallel lists instead of doing per-field dict
+    # gets + str casts + .lower() on every request.
+    core_insights: List[str] = []
+    ethical_reflections: List[str] = []
+    evidence_trimmed: List[list] = []  # first 3 evidence entries per node
+    content_lc: List[str] = []  # lowercased insight+reflection text
+    content_tokens: List[frozenset] = []  # token sets of content_lc
+    # Vector retrieval (None when the optional stack isn't installed)
+    index: Any = None  # faiss index over the node embeddings
+    # Keyword fallback: per-node sorted token-hash arrays, flattened
+    # CSR-style (None when numba/numpy aren't installed)
+    node_token_flat: Any = None  # np.ndarray[int32] — all nodes' tokens
+    node_token_offsets: Any = None  # np.ndarray[int64, (N+1,)]
+    # Semantic matching of precomputed wow-mode answers
+    precomp_vecs: Any = None  # np.ndarray[float32, (M, d)], L2-normalized
+    precomp_index: Any = None  # small faiss.IndexFlatIP over the questions
+    # Lexical fallback as one sparse matmul (None without scipy)
+    precomp_bow: Any = None  # scipy csr_matrix[int8, (M, V)] token presence
+    precomp_vocab: Dict[str, int] = {}  # token -> column id
+
+
+state = AppState()
+
+
+# ----------------------------
+# Pydantic models
+# ----------------------------
+
+class DemoRequest(BaseModel):
+    question: str
+
+
+class DemoAnswer(BaseModel):
+    answer: str
+    input_tokens: int
+    output_tokens: int
+    time_s: float
+    nodes_used: int
+    context_bullets: List[str]
+
+
+class DemoResponse(BaseModel):
+    question: str
+    baseline: DemoAnswer
+    ads: DemoAnswer
+    raw_metrics: Dict[str, Any]
+
+
+class HealthResponse(BaseModel):
+    status: str
+    nodes_loaded: int
+    pack_name: str
+    precomputed_loaded: int
+
+
+# ----------------------------
+# Data loading
+# ----------------------------
+
+def load_data_pack():
+    """Load wisdom nodes and demo questions from the golden sample pack."""
+    nodes: List[dict] = []
+    questions: List[str] = []
+
+    nodes_path = DATA_DIR / "golden_nodes.jsonl"
+    questions_path = DATA_DIR / "demo_questions.json"
+
+    # Wisdom nodes — parse the raw bytes line-chunks directly, no
+    # text-mode decode or per-line strip needed.
+    if nodes_path.exists():
+        for line in nodes_path.read_bytes().splitlines():
+            if not line:
+                continue
+            try:
+                node = _json_loads(line)
+            except ValueError:
+                continue
+            # Normalize evidence to list
+            ev = node.get("evidence", [])
+            if isinstance(ev, str):
+                node["evidence"] = [ev]
+            elif ev is None:
+                node["evidence"] = []
+            nodes.append(node)
+        print(f"[ADS DEMO] Loaded {len(nodes)} wisdom nodes from {nodes_path}")
+    else:
+        print(f"[ADS DEMO] Warning: {nodes_path} not found")
+
+    # Demo questions
+    if questions_path.exists():
+        try:
+            data = _json_loads(questions_path.read_bytes())
+            questions = data.get("questions", [])
+            print(f"[ADS DEMO] Loaded {len(questions)} demo questions from {questions_path}")
+        except Exception as e:
+            print(f"[ADS DEMO] Error loading questions: {e}")
+
+    # Fallback default questions
+    if not questions:
+        questions = [
+            "When should an AI say 'I don't know' instead of giving a partial answer?",
+            "Why is it dangerous to act confident when you're actually uncertain?",
+            "How can a person stay honest when telling the full truth might hurt them?",
+            "What does it mean to be humble about what you know?",
+            "How should a system respond when the evidence is incomplete or conflicting?",
+        ]
+
+    return nodes, questions
+
+
+def transpose_nodes(nodes: List[dict]) -> None:
+    """Build the struct-of-arrays view of the node pack on `state`."""
+    state.core_insights = [str(n.get("core_insight", "")) for n in nodes]
+    state.ethical_reflections = [str(n.get("ethical_reflection", "")) for n in nodes]
+    state.evidence_trimmed = [(n.get("evidence") or [])[:3] for n in nodes]
+    state.content_lc = [
+        f"{ins} {ref}".lower()
+        for ins, ref in zip(state.core_insights, state.ethical_reflections)
+    ]
+    # Token sets are query-invariant: build them once here so the
+    # keyword scorer does a single C-level set intersection per node.
+    state.content_tokens = [frozenset(text.split()) for text in state.content_lc]
+    # Pre-render the evidence bullet block build_ads_prompt embeds — it
+    # never changes after load. Stashed on the node dict so the prompt
+    # builder can use it without threading indices around.
+    for n, ev in zip(nodes, state.evidence_trimmed):
+        n["_evidence_text"] = "\n".join(f"- {e}" for e in ev)
+
+
+def _node_embedding_text(node: dict) -> str:
+    """Text we embed for a node: same fields the keyword scorer uses."""
+    return f"{node.get('core_insight', '')} {node.get('ethical_reflection', '')}"
+
+
+def _build_index_from_vecs(faiss, vecs):
+    """Build the configured index type over a normalized float32 matrix."""
+    contig = np.ascontiguousarray(vecs, dtype=np.float32)
+    if ADS_QUANTIZE:
+        index = faiss.IndexScalarQuantizer(
+            vecs.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(contig)
+    else:
+        index = _new_faiss_index(faiss, vecs.shape[1])
+    index.add(contig)
+    return index
+
+
+def _new_faiss_index(faiss, d: int):
+    """Create an empty FAISS index of the configured type (ADS_INDEX_TYPE)."""
+    if ADS_INDEX_TYPE == "hnsw":
+        # Navigable small-world graph: log-depth walks instead of a full
+        # scan, ~same recall at much higher throughput once N >= ~10k.
+        index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+        return index
+    return faiss.IndexFlatIP(d)
+
+
+def _pack_cache_key() -> str:
+    """Cache key for derived artifacts: blake2b of the raw nodes file bytes."""
+    nodes_path = DATA_DIR / "golden_nodes.jsonl"
+    if not nodes_path.exists():
+        return "empty"
+    return hashlib.blake2b(nodes_path.read_bytes(), digest_size=16).hexdigest()
+
+
+def build_vector_index(nodes: List[dict]):
+    """
+    Embed all nodes once and build a FAISS inner-product index.
+
+    Vectors are L2-normalized, so inner product == cosine similarity.
+    The embedding matrix and index are cached on disk keyed by a hash of
+    golden_nodes.jsonl (golden_nodes.<hash>.npy / nodes.<hash>.faiss), so
+    a restart with unchanged data memory-maps the matrix and reads the
+    index instead of re-running N transformer passes. Returns the index,
+    or None when the optional stack isn't installed or there are no
+    nodes.
+    """
+    faiss = _import_faiss()
+    if faiss is None or not (NUMPY_AVAILABLE and nodes):
+        return None
+
+    key = _pack_cache_key()
+    vecs_path = DATA_DIR / f"golden_nodes.{key}.npy"
+    # The index contents depend on the type/quantization knobs as well as
+    # the data, so both are part of the filename — flipping ADS_INDEX_TYPE
+    # or ADS_QUANTIZE must not silently load an index built with other
+    # settings.
+    variant = ADS_INDEX_TYPE + (".q8" if ADS_QUANTIZE else "")
+    index_path = DATA_DIR / f"nodes.{key}.{variant}.faiss"
+
+    vecs = None
+    if vecs_path.exists():
+        try:
+            # mmap: subsequent starts pay an fstat + page faults, not N
+            # forward passes; pages are shared with other workers.
+            vecs = np.load(vecs_path, mmap_mode="r")
+            print(f"[ADS DEMO] Memory-mapped cached node embeddings from {vecs_path}")
+        except Exception as e:
+            print(f"[ADS DEMO] Could not mmap {vecs_path}: {e} — re-embedding")
+            vecs = None
+
+    if vecs is None:
+        vecs = embeddings.embed_texts([_node_embedding_text(n) for n in nodes])
+        if vecs is None:
+            return None
+        try:
+            np.save(vecs_path, vecs)
+        except Exception as e:
+            print(f"[ADS DEMO] Warning: could not cache embeddings: {e}")
+
+    if index_path.exists():
+        try:
+            index = faiss.read_index(str(index_path))
+            if index.ntotal == len(vecs):
+                print(f"[ADS DEMO] Loaded FAISS index from {index_path} ({index.ntotal} vectors)")
+                return index
+            print(
+                f"[ADS DEMO] Cached index has {index.ntotal} vectors, "
+                f"expected {len(vecs)} — rebuilding"
+            )
+        except Exception as e:
+            print(f"[ADS DEMO] Could not read {index_path}: {e} — rebuilding")
+
+    index = _build_index_from_vecs(faiss, vecs)
+    print(
+        f"[ADS DEMO] Built FAISS '{ADS_INDEX_TYPE}' index over "
+        f"{index.ntotal} node embeddings (d={vecs.shape[1]}, "
+        f"quantized={ADS_QUANTIZE})"
+    )
+    try:
+        faiss.write_index(index, str(index_path))
+    except Exception as e:
+        print(f"[ADS DEMO] Warning: could not persist FAISS index: {e}")
+    return index
+
+
+def embed_query(question: str):
+    """Embed + normalize a single query string (returns None without the stack)."""
+    return embeddings.embed_query(question)
+
+
+def _tag_precomputed_tokens(items: List[dict]) -> List[dict]:
+    """Stash each item's lowercase question token set for the keyword matcher."""
+    for item in items:
+        item["_q_tokens"] = frozenset(str(item.get("question", "")).lower().split())
+    return items
+
+
+def load_precomputed_answers() -> List[dict]:
+    """Load precomputed baseline vs ADS answers for wow-mode."""
+    if not PRECOMPUTED_PATH.exists():
+        print(f"[ADS DEMO] No precomputed_answers.json found at {PRECOMPUTED_PATH}")
+        return []
+    try:
+        data = _json_loads(PRECOMPUTED_PATH.read_bytes())
+        if isinstance(data, dict):
+            # allow dict of id -> item
+            items = []
+            for item in data.values():
+                if isinstance(item, dict):
+                    items.append(item)
+            print(f"[ADS DEMO] Loaded {len(items)} precomputed answers (dict form)")
+            return _tag_precomputed_tokens(items)
+        elif isinstance(data, list):
+            print(f"[ADS DEMO] Loaded {len(data)} precomputed answers (list form)")
+            return _tag_precomputed_tokens(data)
+        else:
+            print("[ADS DEMO] precomputed_answers.json has unexpected format")
+            return []
+    except Exception as e:
+        print(f"[ADS DEMO] Error loading precomputed answers: {e}")
+        return []
+
+
+# ----------------------------
+# Keyword-overlap scoring (Numba-compiled fallback path)
+# ----------------------------
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _count_overlap(q_tokens, n_tokens):  # pragma: no cover - compiled
+        """Two-pointer merge over two sorted int32 arrays; returns overlap."""
+        i = 0
+        j = 0
+        count = 0
+        while i < q_tokens.size and j < n_tokens.size:
+            a = q_tokens[i]
+            b = n_tokens[j]
+            if a == b:
+                count += 1
+                i += 1
+                j += 1
+            elif a < b:
+                i += 1
+            else:
+                j += 1
+        return count
+
+    @njit(parallel=True, cache=True)
+    def _score_all_nodes(q_tokens, flat, offsets, out):  # pragma: no cover
+        """Fill out[i] with the token overlap of the query vs node i."""
+        for idx in prange(offsets.size - 1):
+            out[idx] = _count_overlap(q_tokens, flat[offsets[idx] : offsets[idx + 1]])
+
+
+def _token_hashes(text: str):
+    """Lowercased words -> sorted unique int32 hash array."""
+    words = text.lower().split()
+    arr = np.fromiter((hash(w) & 0x7FFFFFFF for w in words), dtype=np.int32, count=len(words))
+    return np.sort(np.unique(arr))
+
+
+def build_token_index(content_lc: List[str]):
+    """
+    Pre-encode each node's insight+reflection token set once at load time
+    as one flat sorted-int32 array plus CSR-style offsets, so request-time
+    scoring is a compiled two-pointer merge instead of Python set ops.
+    """
+    if not (NUMBA_AVAILABLE and content_lc):
+        return None, None
+    per_node = [_token_hashes(text) for text in content_lc]
+    offsets = np.zeros(len(per_node) + 1, dtype=np.int64)
+    np.cumsum([t.size for t in per_node], out=offsets[1:])
+    flat = np.concatenate(per_node) if per_node else np.empty(0, dtype=np.int32)
+    return flat.astype(np.int32), offsets
+
+
+def warmup_keyword_jit():
+    """Trigger Numba compilation at startup so the first request doesn't pay it."""
+    if state.node_token_offsets is None:
+        return
+    q = _token_hashes("warm up the jit compiler")
+    out = np.zeros(state.node_token_offsets.size - 1, dtype=np.int32)
+    _score_all_nodes(q, state.node_token_flat, state.node_token_offsets, out)
+
+
+# ----------------------------
+# Retrieval & comparison
+# ----------------------------
+
+def retrieve_context(
+    question: str, nodes: List[dict], k: int = 3, q_vec: Any = None
+) -> tuple[list, float]:
+    """
+    Retrieve the k most relevant wisdom nodes for a question.
+
+    Preferred path: FAISS cosine search over precomputed node embeddings —
+    one embedding forward pass + one BLAS matvec per query instead of
+    tokenizing every node in Python.
+
+    Fallback (vector stack not installed): the original keyword overlap.
+    """
+    if not nodes:
+        return [], 0.0
+
+    # Vector path
+    if state.index is not None:
+        if q_vec is None:
+            q_vec = embed_query(question)
+        if q_vec is not None:
+            D, I = state.index.search(q_vec, min(k, len(nodes)))
+            top = [nodes[i] for i in I[0] if i >= 0]
+            avg_relevance = float(D[0].mean()) if len(D[0]) else 0.0
+            return top, avg_relevance
+
+    # Keyword fallback, compiled path: scores land in a preallocated
+    # int32 array via the Numba kernel, no Python set ops per node.
+    if state.node_token_offsets is not None and len(nodes) == state.node_token_offsets.size - 1:
+        q_tokens = _token_hashes(question)
+        scores = np.zeros(len(nodes), dtype=np.int32)
+        _score_all_nodes(q_tokens, state.node_token_flat, state.node_token_offsets, scores)
+
+        # O(N) partial selection, then sort only the k survivors —
+        # a full argsort is O(N log N) for 3 winners.
+        if k < len(nodes):
+            order = np.argpartition(-scores, k)[:k]
+            order = order[np.argsort(-scores[order])]
+        else:
+            order = np.argsort(-scores)
+        top = [nodes[i] for i in order if scores[i] > 0]
+        if not top:
+            # if nothing overlaps, still take the top k so demo doesn't look empty
+            top = [nodes[i] for i in order]
+        avg_relevance = (
+            float(scores[order].sum()) / len(top) if top and len(nodes) >= k else 0.0
+        )
+        return top, avg_relevance
+
+    # Keyword fallback, pure-Python path: single scan with a k-slot
+    # insertion array — O(N) time, O(k) memory, no (score, node) pair
+    # list materialized per request.
+    question_lower = question.lower()
+    keywords = set(question_lower.split())
+
+    use_soa = len(state.content_tokens) == len(nodes)
+    top_idx = [-1] * k
+    top_scores = [-1] * k
+    for i, n in enumerate(nodes):
+        if use_soa:
+            score = len(keywords & state.content_tokens[i])
+        else:
+            content = (
+                str(n.get("core_insight", "")) + " " + str(n.get("ethical_reflection", ""))
+            ).lower()
+            score = len(keywords.intersection(content.split()))
+        if score > top_scores[-1]:
+            j = k - 1
+            while j > 0 and top_scores[j - 1] < score:
+                top_scores[j] = top_scores[j - 1]
+                top_idx[j] = top_idx[j - 1]
+                j -= 1
+            top_scores[j] = score
+            top_idx[j] = i
+
+    top = [nodes[i] for i, s in zip(top_idx, top_scores) if i >= 0 and s > 0]
+    if not top:
+        # if nothing overlaps, still take the top k so demo doesn't look empty
+        top = [nodes[i] for i in top_idx if i >= 0]
+
+    avg_relevance = (
+        sum(s for s in top_scores if s >= 0) / len(top)
+        if top and len(nodes) >= k
+        else 0.0
+    )
+    return top, avg_relevance
+
+
+# Static prompt preambles, built once at import — the per-request
+# builders only fill in the dynamic slots.
+_BASELINE_PREAMBLE = (
+    "You are a helpful, honest assistant.\n\n"
+    "Answer the user's question as clearly and precisely as you can.\n"
+    "If you are missing key information, say so explicitly instead of guessing.\n"
+)
+
+_ADS_PREAMBLE = (
+    "You are a careful, humble assistant grounded in curated wisdom.\n\n"
+    "You will see a set of 'wisdom nodes' extracted from trusted sources. "
+    "Use them to answer the user's question, but DO NOT exaggerate beyond the evidence.\n\n"
+    "Guidelines:\n"
+    "- Prefer to say 'I don't know' or 'the evidence is limited' over guessing.\n"
+    "- Explicitly cite insights from the wisdom nodes when they support your answer.\n"
+    "- Mention tradeoffs, limits, or counterpoints if they appear in the nodes.\n"
+    "- Be warm, honest, and precise.\n"
+)
+
+
+_WS_RUN = re.compile(r"\s+")
+
+
+def _canonicalize(s: str) -> str:
+    """
+    Collapse whitespace runs within each line and strip line edges.
+
+    Stray spacing in otherwise-identical questions would miss both the
+    local response cache and provider prompt caches, which key on exact
+    bytes.
+    """
+    return "\n".join(_WS_RUN.sub(" ", line).strip() for line in s.splitlines()).strip()
+
+
+def build_baseline_prompt(question: str) -> str:
+    return f"{_BASELINE_PREAMBLE}\nUser question:\n{_canonicalize(question)}\n"
+
+
+def _node_evidence_text(n: dict) -> str:
+    """Evidence bullet block for a node (cached at load by transpose_nodes)."""
+    cached = n.get("_evidence_text")
+    if cached is not None:
+        return cached
+    evidence = n.get("evidence", [])
+    if isinstance(evidence, str):
+        evidence = [evidence]
+    return "\n".join(f"- {e}" for e in evidence[:3])
+
+
+# Token budget for the wisdom-node block of the ADS prompt; ~4 chars per
+# token. Unbounded context costs money and, past provider cache-chunk
+# boundaries, stops prefix caching from engaging at all.
+MAX_ADS_CONTEXT_TOKENS = int(_env("LLM_MAX_CONTEXT_TOKENS", "3072") or "3072")
+
+# Anthropic only caches prefixes of >= 1024 tokens; warn below that
+# (once per process — with a small data pack every request is under it).
+_PREFIX_CACHE_MIN_TOKENS = 1024
+_prefix_cache_warned = False
+
+
+def _node_token_estimate(n: dict) -> int:
+    """Rough token count for a node's prompt chunk (len // 4 heuristic)."""
+    text_len = (
+        len(str(n.get("core_insight") or ""))
+        + len(str(n.get("ethical_reflection") or ""))
+        + len(_node_evidence_text(n))
+        + len(str(n.get("source_uri", n.get("source", "")) or ""))
+    )
+    return text_len // 4 + 16  # + chunk scaffolding
+
+
+def build_ads_prompt_parts(question: str, context_nodes: List[dict]) -> Tuple[str, str]:
+    """
+    Build the ADS prompt as (stable_prefix, tail).
+
+    The preamble + wisdom nodes are stable across a demo session while
+    only the question changes, so they come first: providers that cache
+    prompt prefixes (see llm_client._call_anthropic) can then serve the
+    expensive part from their KV cache on every question after the first.
+    """
+    # Greedy budget pass in retrieval-rank order: keep the best nodes,
+    # drop the tail once MAX_ADS_CONTEXT_TOKENS is spent (always keeping
+    # at least one so the ADS answer stays grounded).
+    budget = MAX_ADS_CONTEXT_TOKENS
+    kept: List[dict] = []
+    for n in context_nodes:
+        est = _node_token_estimate(n)
+        if kept and est > budget:
+            break
+        kept.append(n)
+        budget -= est
+    if len(kept) < len(context_nodes):
+        print(
+            f"[ADS DEMO] Context truncated to {len(kept)}/{len(context_nodes)} nodes "
+            f"(LLM_MAX_CONTEXT_TOKENS={MAX_ADS_CONTEXT_TOKENS})"
+        )
+
+    # Stable node order: retrieval can return score-tied nodes in either
+    # order, which would make otherwise-identical prefixes byte-different
+    # and defeat prefix caching. Sort by content hash, not score.
+    context_nodes = sorted(
+        kept,
+        key=lambda n: hashlib.blake2b(str(n.get("core_insight") or "").encode("utf-8")).digest(),
+    )
+
+    # Assemble the prefix as one flat parts list + a single join: no
+    # per-node chunk strings and no intermediate context_block. Output
+    # bytes are identical to the old nested f-string/join version.
+    parts: List[str] = [_ADS_PREAMBLE, "\nWisdom nodes:\n"]
+    if context_nodes:
+        for i, n in enumerate(context_nodes, start=1):
+            if i > 1:
+                parts.append("\n\n")
+            parts.extend((
+                "Node ", str(i), " — Core Insight:\n",
+                str(n.get("core_insight") or ""),
+                "\n\nEthical Reflection:\n",
+                str(n.get("ethical_reflection") or ""),
+                "\n\nEvidence:\n",
+                _node_evidence_text(n),
+                "\n\nSource: ", str(n.get("source_uri", n.get("source", ""))), "\n",
+            ))
+    else:
+        parts.append("No prior nodes selected.")
+    parts.append("\n")
+
+    prefix = "".join(parts)
+    global _prefix_cache_warned
+    if (
+        context_nodes
+        and not _prefix_cache_warned
+        and len(prefix) // 4 < _PREFIX_CACHE_MIN_TOKENS
+    ):
+        _prefix_cache_warned = True
+        print(
+            f"[ADS DEMO] ADS prefix ~{len(prefix) // 4} tokens — below the "
+            f"{_PREFIX_CACHE_MIN_TOKENS}-token provider prompt-cache threshold"
+        )
+    tail = f"\nUser question:\n{_canonicalize(question)}\n"
+    return prefix, tail
+
+
+def build_ads_prompt(question: str, context_nodes: List[dict]) -> str:
+    prefix, tail = build_ads_prompt_parts(question, context_nodes)
+    return prefix + tail
+
+
+def build_precomputed_index(items: List[dict]):
+    """
+    Embed each precomputed question once so choose_precomputed is a
+    single FAISS lookup instead of a Python scan — and matches on
+    meaning rather than shared words.
+    """
+    faiss = _import_faiss()
+    if faiss is None or not items:
+        return None, None
+    vecs = embeddings.embed_texts([str(item.get("question", "")) for item in items])
+    if vecs is None:
+        return None, None
+    index = faiss.IndexFlatIP(vecs.shape[1])
+    index.add(vecs)
+    return vecs, index
+
+
+def build_precomputed_bow(items: List[dict]):
+    """
+    Binary token-presence CSR matrix over the precomputed questions, so
+    the lexical fallback scores every item with one sparse matvec
+    instead of M Python set intersections. Needs scipy; returns
+    (None, {}) without it.
+    """
+    if not (NUMPY_AVAILABLE and items):
+        return None, {}
+    try:
+        from scipy.sparse import csr_matrix
+    except ImportError:
+        return None, {}
+
+    vocab: Dict[str, int] = {}
+    indices: List[int] = []
+    indptr: List[int] = [0]
+    for item in items:
+        for tok in item.get("_q_tokens", ()):
+            indices.append(vocab.setdefault(tok, len(vocab)))
+        indptr.append(len(indices))
+    if not vocab:
+        return None, {}
+
+    data = np.ones(len(indices), dtype=np.int8)
+    bow = csr_matrix((data, indices, indptr), shape=(len(items), len(vocab)), dtype=np.int8)
+    return bow, vocab
+
+
+def choose_precomputed(question: str, items: List[dict], q_vec: Any = None) -> dict | None:
+    """Pick the best precomputed answer (semantic match, keyword fallback)."""
+    if not items:
+        return None
+
+    # Semantic path: one embedding + one index probe
+    if state.precomp_index is not None and len(items) == state.precomp_index.ntotal:
+        if q_vec is None:
+            q_vec = embed_query(question)
+        if q_vec is not None:
+            _, I = state.precomp_index.search(q_vec, 1)
+            if I[0, 0] >= 0:
+                return items[I[0, 0]]
+
+    q = question.lower()
+    q_words = set(q.split())
+
+    # Lexical path, vectorized: all M scores from one sparse matvec.
+    # np.argmax keeps the same first-max tie behavior as the loop below.
+    if state.precomp_bow is not None and state.precomp_bow.shape[0] == len(items):
+        q_bow = np.zeros(state.precomp_bow.shape[1], dtype=np.int8)
+        for tok in q_words:
+            col = state.precomp_vocab.get(tok)
+            if col is not None:
+                q_bow[col] = 1
+        scores = state.precomp_bow @ q_bow
+        return items[int(np.argmax(scores))]
+
+    # Keyword-overlap fallback
+    best = None
+    best_score = -1
+    for item in items:
+        t_words = item.get("_q_tokens")
+        if t_words is None:
+            t_words = frozenset(str(item.get("question", "")).lower().split())
+        score = len(q_words & t_words)
+        if score > best_score:
+            best_score = score
+            best = item
+    return best or items[0]
+
+
+def run_precomputed_comparison(question: str, q_vec: Any = None) -> Dict[str, Any]:
+    """Use precomputed answers for wow-mode (mock provider)."""
+    item = choose_precomputed(question, state.precomputed, q_vec)
+    if not item:
+        # Fallback to a generic mock message if file is empty/missing
+        text = (
+            "Precomputed demo answers are not available, but MOCK mode is enabled.\n\n"
+            "Set LLM_PROVIDER + an API key in backend/.env to run fully live."
+        )
+        baseline = {
+            "answer": text,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "time_s": 0.0,
+            "nodes_used": 0,
+            "context_bullets": [],
+        }
+        ads = baseline.copy()
+        return {"baseline": baseline, "ads": ads}
+
+    # Expect structure: {question, baseline, ads, context_bullets}
+    q_text = item.get("question", question)
+    baseline_text = item.get("baseline", "")
+    ads_text = item.get("ads", "")
+    ctx_bullets = item.get("context_bullets", []) or []
+
+    baseline = {
+        "answer": baseline_text,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "time_s": 0.0,
+        "nodes_used": 0,
+        "context_bullets": [],
+    }
+    ads = {
+        "answer": ads_text,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "time_s": 0.0,
+        "nodes_used": len(ctx_bullets),
+        "context_bullets": ctx_bullets,
+    }
+    return {"baseline": baseline, "ads": ads, "question_used": q_text}
+
+
+async def run_live_comparison(
+    question: str, nodes: List[dict], q_vec: Any = None
+) -> Dict[str, Any]:
+    """Run baseline vs ADS-enhanced comparison using a real LLM provider."""
+    # Kick the baseline request off before retrieval. create_task only
+    # schedules the coroutine, so yield once to let it run up to its
+    # first network await — then the request really is in flight while
+    # the synchronous retrieval + ADS prompt construction happen here,
+    # and the wall time is max(t_baseline, t_ads) instead of their sum.
+    baseline_task = asyncio.create_task(
+        generate_response_async(build_baseline_prompt(question))
+    )
+    await asyncio.sleep(0)
+
+    context_nodes, _ = retrieve_context(question, nodes, k=3, q_vec=q_vec)
+    ads_prefix, ads_tail = build_ads_prompt_parts(question, context_nodes)
+
+    baseline_result, ads_result = await asyncio.gather(
+        baseline_task,
+        generate_response_async(ads_prefix + ads_tail, stable_prefix=ads_prefix),
+    )
+
+    # Context bullets for UI
+    context_bullets: List[str] = []
+    for n in context_nodes:
+        insight = n.get("core_insight", "")
+        if insight:
+            context_bullets.append(insight.strip())
+
+    return {
+        "baseline": {
+            "answer": baseline_result["text"],
+            "input_tokens": baseline_result["input_tokens"] or 0,
+            "output_tokens": baseline_result["output_tokens"] or 0,
+            "time_s": baseline_result["time_s"],
+            "cached": baseline_result.get("cached", False),
+            "nodes_used": 0,
+            "context_bullets": [],
+        },
+        "ads": {
+            "answer": ads_result["text"],
+            "input_tokens": ads_result["input_tokens"] or 0,
+            "output_tokens": ads_result["output_tokens"] or 0,
+            "time_s": ads_result["time_s"],
+            "cached": ads_result.get("cached", False),
+            "nodes_used": len(context_nodes),
+            "context_bullets": context_bullets,
+        },
+    }
+
+
+async def run_comparison(question: str, nodes: List[dict]) -> Dict[str, Any]:
+    """
+    Entry point used by the /demo/run endpoint.
+
+    If the LLM provider is 'mock' and precomputed answers exist, we use them
+    to create a jaw-dropping demo with zero API keys.
+
+    Otherwise, we call the live LLM provider via generate_response_async().
+    """
+    # One transformer pass per request: both retrieval paths reuse this.
+    # Only worth it when a vector index exists to consume it, and run in
+    # a worker thread — the forward pass would otherwise block the event
+    # loop for every in-flight request.
+    q_vec = None
+    if state.index is not None or state.precomp_index is not None:
+        q_vec = await asyncio.to_thread(embed_query, question)
+    if is_mock_provider() and state.precomputed:
+        print("[ADS DEMO] Using precomputed WOW-mode answers (mock provider)")
+        return run_precomputed_comparison(question, q_vec)
+    else:
+        return await run_live_comparison(question, nodes, q_vec)
+
+
+# ----------------------------
+# FastAPI lifespan
+# ----------------------------
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize resources at startup."""
+    print("\n" + "=" * 60)
+    print("  ADS WISDOM DEMO — Starting Up")
+    print("=" * 60 + "\n")
+
+    state.nodes, state.demo_questions = load_data_pack()
+    transpose_nodes(state.nodes)
+    state.index = build_vector_index(state.nodes)
+    if state.index is None:
+        print("[ADS DEMO] Vector retrieval unavailable — using keyword fallback")
+    state.node_token_flat, state.node_token_offsets = build_token_index(state.content_lc)
+    warmup_keyword_jit()
+    state.precomputed = load_precomputed_answers()
+    state.precomp_vecs, state.precomp_index = build_precomputed_index(state.precomputed)
+    state.precomp_bow, state.precomp_vocab = build_precomputed_bow(state.precomputed)
+
+    print(f"\n[ADS DEMO] ✅ Nodes loaded: {len(state.nodes)}")
+    print(f"[ADS DEMO] ✅ Precomputed answers: {len(state.precomputed)}")
+    print("[ADS DEMO] 💡 Configure backend/.env to go live with your own LLM")
+    print("\n" + "=" * 60 + "\n")
+
+    yield
+
+    print("\n[ADS DEMO] Shutting down...")
+    await aclose_http_client()
+
+
+# ----------------------------
+# FastAPI app
+# ----------------------------
+
+# orjson-encoded responses when available: DemoResponse bodies encode
+# several times faster than with stdlib json.
+_app_kwargs: Dict[str, Any] = {}
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse
+
+    _app_kwargs["default_response_class"] = ORJSONResponse
+
+app = FastAPI(
+    title="ADS Wisdom Demo API",
+    description="Awakened Data Standard — Baseline vs ADS-Enhanced comparison",
+    version="1.1.0",
+    lifespan=lifespan,
+    **_app_kwargs,
+)
+
+# CORS for frontend
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=False,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Response compression: /demo/run bodies are 5-20 KB of highly
+# compressible natural language. Brotli (better ratio) when the optional
+# brotli-asgi package is installed, gzip otherwise.
+try:
+    from brotli_asgi import BrotliMiddleware
+
+    app.add_middleware(BrotliMiddleware, minimum_size=512)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=6)
+
+# Serve frontend static files
+if FRONTEND_DIR.exists():
+    app.mount("/assets", StaticFiles(directory=FRONTEND_DIR / "assets"), name="assets")
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+
+@app.get("/")
+def serve_frontend():
+    """Serve the main demo page."""
+    index_path = FRONTEND_DIR / "index.html"
+    if index_path.exists():
+        return FileResponse(index_path)
+    return {"message": "ADS Wisdom Demo API", "docs": "/docs"}
+
+
+@app.get("/health", response_model=HealthResponse)
+def health():
+    """Health check endpoint."""
+    return HealthResponse(
+        status="healthy",
+        nodes_loaded=len(state.nodes),
+        pack_name="Golden_Ethics_Sample_v1",
+        precomputed_loaded=len(state.precomputed),
+    )
+
+
+@app.get("/questions")
+def get_questions():
+    """Get demo questions."""
+    return {"questions": state.demo_questions}
+
+
+@app.post("/demo/run", response_model=DemoResponse)
+async def run_demo(req: DemoRequest):
+    """Run baseline vs ADS comparison for a question."""
+    question = req.question.strip()
+    if not question:
+        question = state.demo_questions[0] if state.demo_questions else "What is wisdom?"
+
+    results = await run_comparison(question, state.nodes)
+
+    baseline = DemoAnswer(**results["baseline"])
+    ads = DemoAnswer(**results["ads"])
+
+    # raw_metrics can include extra info if you want
+    return DemoResponse(
+        question=question,
+        baseline=baseline,
+        ads=ads,
+        raw_metrics=results,
+    )
+
+
+# ----------------------------
+# Direct run
+# ----------------------------
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop (libuv event loop) and httptools (C HTTP parser) ship with
+    # uvicorn[standard]; fall back to the pure-Python defaults otherwise.
+    try:
+        import httptools  # noqa: F401
+        import uvloop  # noqa: F401
+
+        loop_impl, http_impl = "uvloop", "httptools"
+    except ImportError:
+        loop_impl, http_impl = "auto", "auto"
+
+    # One worker per two cores by default (override with ADS_WORKERS).
+    # Workers share the mmap-backed embedding/index caches through the
+    # OS page cache instead of holding per-process copies.
+    workers = int(_env("ADS_WORKERS", "0") or "0") or max(1, (os.cpu_count() or 2) // 2)
+
+    print("\n🦁 Starting ADS Wisdom Demo...")
+    print("📍 Open http://localhost:8888 in your browser\n")
+    uvicorn.run(
+        "ads_demo_api:app",
+        host="0.0.0.0",
+        port=8888,
+        loop=loop_impl,
+        http=http_impl,
+        workers=workers,
+    )
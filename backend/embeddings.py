@@ -0,0 +1,90 @@
+# backend/embeddings.py
+# ADS Wisdom Demo — sentence-embedding helpers
+
+"""
+Shared embedding helpers for the Awakened Wisdom Demo.
+
+One place owns the sentence-transformer model so every caller
+(node index, precomputed-answer index, per-request query embedding)
+shares a single forward pass per unique text. The stack is optional:
+without numpy + sentence-transformers the helpers return None and the
+backend falls back to keyword retrieval. The heavy imports are deferred
+to first use so a mock-only demo never pays for them.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None  # type: ignore[assignment]
+    NUMPY_AVAILABLE = False
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+_MODEL: Any = None
+_MODEL_UNAVAILABLE = False
+
+# Demos repeat the same handful of questions — keep the last few query
+# vectors so re-asking skips the transformer pass entirely.
+_QUERY_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+_QUERY_CACHE_MAX = 64
+
+
+def get_model() -> Any:
+    """
+    Lazily load (and then reuse) the sentence-transformer model.
+
+    The sentence_transformers import itself is deferred to here — it
+    drags in torch, so a mock-only demo should never pay for it.
+    Returns None when the stack isn't installed.
+    """
+    global _MODEL, _MODEL_UNAVAILABLE
+    if _MODEL is not None or _MODEL_UNAVAILABLE:
+        return _MODEL
+    if not NUMPY_AVAILABLE:
+        _MODEL_UNAVAILABLE = True
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        _MODEL_UNAVAILABLE = True
+        return None
+    _MODEL = SentenceTransformer(EMBED_MODEL_NAME)
+    return _MODEL
+
+
+def embed_texts(texts: List[str]) -> Any:
+    """Embed a batch of texts into an L2-normalized float32 (N, d) matrix."""
+    model = get_model()
+    if model is None:
+        return None
+    vecs = model.encode(texts, convert_to_numpy=True).astype(np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    np.divide(vecs, norms, out=vecs, where=norms > 0)
+    return vecs
+
+
+def embed_query(text: str) -> Optional[Any]:
+    """
+    Embed a single query string into a normalized (1, d) float32 vector.
+
+    Cached in a small LRU keyed by the raw text, so one /demo/run does a
+    single forward pass even when both retrieval paths need the vector.
+    """
+    vec = _QUERY_CACHE.get(text)
+    if vec is not None:
+        _QUERY_CACHE.move_to_end(text)
+        return vec
+    vec = embed_texts([text])
+    if vec is None:
+        return None
+    _QUERY_CACHE[text] = vec
+    while len(_QUERY_CACHE) > _QUERY_CACHE_MAX:
+        _QUERY_CACHE.popitem(last=False)
+    return vec
@@ -1,376 +1,950 @@
-"""
-LLM Client for Awakened Wisdom Demo
-
-This file is designed so that demo runners NEVER have to edit it.
-
-Configuration comes from:
-- backend/.env   (simple text file next to this file)
-- or real environment variables
-
-Supported providers via LLM_PROVIDER:
-- openai     (OpenAI Responses API)
-- anthropic  (Anthropic Messages API)
-- openrouter (OpenRouter chat completions)
-- ollama     (local LLM via Ollama)
-- mock       (default; uses precomputed answers in the backend)
-
-Expected return format (used by ads_demo_api):
-{
-    "text": str,
-    "input_tokens": int | None,
-    "output_tokens": int | None,
-    "time_s": float
-}
-"""
-
-from __future__ import annotations
-
-import json
-import os
-import time
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Dict, Optional
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
-
-
-# ---------------------------------------------------------------------------
-# Simple .env loader (backend/.env only, no guessing)
-# ---------------------------------------------------------------------------
-
-def _load_backend_env() -> None:
-    """Load key=value pairs from backend/.env into os.environ (if set)."""
-    this_dir = Path(__file__).resolve().parent
-    env_path = this_dir / ".env"
-    if not env_path.exists():
-        print("[ADS DEMO] No backend/.env found – using environment variables or mock mode")
-        return
-
-    print(f"[ADS DEMO] Loading backend/.env from {env_path}")
-    try:
-        with env_path.open("r", encoding="utf-8") as f:
-            for raw in f:
-                line = raw.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if "=" not in line:
-                    continue
-                k, v = line.split("=", 1)
-                k = k.strip()
-                v = v.strip().strip('"').strip("'")
-                # Do not override real env vars
-                if k and (k not in os.environ):
-                    os.environ[k] = v
-    except Exception as e:
-        print(f"[ADS DEMO] Warning: failed to parse backend/.env: {e}")
-
-
-_load_backend_env()
-
-
-# ---------------------------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------------------------
-
-def _env(name: str, default: Optional[str] = None) -> Optional[str]:
-    v = os.environ.get(name)
-    if v is None or v == "":
-        return default
-    return v
-
-
-@dataclass
-class LLMResult:
-    text: str
-    input_tokens: Optional[int]
-    output_tokens: Optional[int]
-    time_s: float
-
-
-def _post_json(url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout_s: int = 90) -> Dict[str, Any]:
-    data = json.dumps(payload).encode("utf-8")
-    req = Request(url, data=data, headers={**headers, "Content-Type": "application/json"}, method="POST")
-    with urlopen(req, timeout=timeout_s) as resp:
-        body = resp.read().decode("utf-8")
-        return json.loads(body)
-
-
-def _safe_int(x: Any) -> Optional[int]:
-    try:
-        if x is None:
-            return None
-        return int(x)
-    except Exception:
-        return None
-
-
-# ---------------------------------------------------------------------------
-# Provider calls
-# ---------------------------------------------------------------------------
-
-def _call_openai(prompt: str) -> LLMResult:
-    api_key = _env("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing OPENAI_API_KEY in backend/.env or environment.")
-
-    model = _env("LLM_MODEL", "gpt-4o")
-    temperature = float(_env("LLM_TEMPERATURE", "0.2"))
-    max_out = int(_env("LLM_MAX_OUTPUT_TOKENS", "900"))
-    instructions = _env("LLM_SYSTEM", "")
-
-    url = _env("OPENAI_BASE_URL", "https://api.openai.com/v1/responses")
-    headers = {"Authorization": f"Bearer {api_key}"}
-
-    payload: Dict[str, Any] = {
-        "model": model,
-        "input": prompt,
-        "temperature": temperature,
-        "max_output_tokens": max_out,
-    }
-    if instructions:
-        payload["instructions"] = instructions
-
-    t0 = time.time()
-    data = _post_json(url, headers, payload)
-    dt = time.time() - t0
-
-    text_parts = []
-    for item in data.get("output", []) or []:
-        for c in item.get("content", []) or []:
-            if isinstance(c, dict) and c.get("type") in ("output_text", "text") and "text" in c:
-                text_parts.append(c["text"])
-    text = "\n".join([p for p in text_parts if p]).strip()
-
-    usage = data.get("usage") or {}
-    input_tokens = _safe_int(usage.get("input_tokens"))
-    output_tokens = _safe_int(usage.get("output_tokens"))
-
-    return LLMResult(
-        text=text or "(No text returned from OpenAI.)",
-        input_tokens=input_tokens,
-        output_tokens=output_tokens,
-        time_s=dt,
-    )
-
-
-def _call_anthropic(prompt: str) -> LLMResult:
-    api_key = _env("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing ANTHROPIC_API_KEY in backend/.env or environment.")
-
-    model = _env("LLM_MODEL", "claude-3-5-sonnet-latest")
-    temperature = float(_env("LLM_TEMPERATURE", "0.2"))
-    max_tokens = int(_env("LLM_MAX_OUTPUT_TOKENS", "900"))
-    system = _env("LLM_SYSTEM", "")
-
-    url = _env("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1/messages")
-    headers = {
-        "x-api-key": api_key,
-        "anthropic-version": _env("ANTHROPIC_VERSION", "2023-06-01"),
-    }
-
-    payload: Dict[str, Any] = {
-        "model": model,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "messages": [{"role": "user", "content": prompt}],
-    }
-    if system:
-        payload["system"] = system
-
-    t0 = time.time()
-    data = _post_json(url, headers, payload)
-    dt = time.time() - t0
-
-    text_parts = []
-    for c in data.get("content", []) or []:
-        if isinstance(c, dict) and c.get("type") == "text" and "text" in c:
-            text_parts.append(c["text"])
-    text = "\n".join([p for p in text_parts if p]).strip()
-
-    usage = data.get("usage") or {}
-    input_tokens = _safe_int(usage.get("input_tokens"))
-    output_tokens = _safe_int(usage.get("output_tokens"))
-
-    return LLMResult(
-        text=text or "(No text returned from Anthropic.)",
-        input_tokens=input_tokens,
-        output_tokens=output_tokens,
-        time_s=dt,
-    )
-
-
-def _call_openrouter(prompt: str) -> LLMResult:
-    api_key = _env("OPENROUTER_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing OPENROUTER_API_KEY in backend/.env or environment.")
-
-    model = _env("LLM_MODEL", "openai/gpt-4o-mini")
-    temperature = float(_env("LLM_TEMPERATURE", "0.2"))
-    max_tokens = int(_env("LLM_MAX_OUTPUT_TOKENS", "900"))
-    system = _env("LLM_SYSTEM", "")
-
-    url = _env("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
-    headers = {"Authorization": f"Bearer {api_key}"}
-
-    messages = []
-    if system:
-        messages.append({"role": "system", "content": system})
-    messages.append({"role": "user", "content": prompt})
-
-    payload: Dict[str, Any] = {
-        "model": model,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
-
-    t0 = time.time()
-    data = _post_json(url, headers, payload)
-    dt = time.time() - t0
-
-    text = ""
-    try:
-        text = (data.get("choices") or [])[0]["message"]["content"]
-    except Exception:
-        text = ""
-
-    usage = data.get("usage") or {}
-    input_tokens = _safe_int(usage.get("prompt_tokens"))
-    output_tokens = _safe_int(usage.get("completion_tokens"))
-
-    return LLMResult(
-        text=text or "(No text returned from OpenRouter.)",
-        input_tokens=input_tokens,
-        output_tokens=output_tokens,
-        time_s=dt,
-    )
-
-
-def _call_ollama(prompt: str) -> LLMResult:
-    base_url = _env("OLLAMA_BASE_URL", "http://localhost:11434")
-    model = _env("LLM_MODEL", "llama3.1")
-    temperature = float(_env("LLM_TEMPERATURE", "0.2"))
-    system = _env("LLM_SYSTEM", "")
-
-    url = base_url.rstrip("/") + "/api/chat"
-    headers: Dict[str, str] = {}
-
-    messages = []
-    if system:
-        messages.append({"role": "system", "content": system})
-    messages.append({"role": "user", "content": prompt})
-
-    payload: Dict[str, Any] = {
-        "model": model,
-        "messages": messages,
-        "stream": False,
-        "options": {"temperature": temperature},
-    }
-
-    t0 = time.time()
-    data = _post_json(url, headers, payload, timeout_s=180)
-    dt = time.time() - t0
-
-    text = ""
-    try:
-        text = (data.get("message") or {}).get("content", "")
-    except Exception:
-        text = ""
-
-    input_tokens = _safe_int(data.get("prompt_eval_count"))
-    output_tokens = _safe_int(data.get("eval_count"))
-
-    return LLMResult(
-        text=text or "(No text returned from Ollama.)",
-        input_tokens=input_tokens,
-        output_tokens=output_tokens,
-        time_s=dt,
-    )
-
-
-def _call_mock(prompt: str) -> LLMResult:
-    t0 = time.time()
-    text = (
-        "MOCK MODE is enabled (LLM_PROVIDER=mock or missing).\n\n"
-        "To make this demo fully interactive, set LLM_PROVIDER + an API key in backend/.env.\n"
-        "Example:\n"
-        "  LLM_PROVIDER=openai\n"
-        "  OPENAI_API_KEY=sk-...\n"
-        "  LLM_MODEL=gpt-4o\n\n"
-        f"Prompt received (first 500 chars):\n{prompt[:500]}"
-    )
-    dt = time.time() - t0
-    return LLMResult(text=text, input_tokens=None, output_tokens=None, time_s=dt)
-
-
-# ---------------------------------------------------------------------------
-# Public API
-# ---------------------------------------------------------------------------
-
-def is_mock_provider() -> bool:
-  """Helper used by ads_demo_api to decide if we should use precomputed answers."""
-  provider = (_env("LLM_PROVIDER", "mock") or "mock").strip().lower()
-  print(f"[ADS DEMO] LLM_PROVIDER resolved to '{provider}'")
-  return provider == "mock"
-
-
-def generate_response(prompt: str, **_kwargs: Any) -> Dict[str, Any]:
-    """
-    Called by the demo backend.
-
-    Returns a dict with:
-    - text
-    - input_tokens
-    - output_tokens
-    - time_s
-    """
-    provider = (_env("LLM_PROVIDER", "mock") or "mock").strip().lower()
-    print(f"[ADS DEMO] generate_response using provider='{provider}'")
-
-    try:
-        if provider == "openai":
-            r = _call_openai(prompt)
-        elif provider == "anthropic":
-            r = _call_anthropic(prompt)
-        elif provider == "openrouter":
-            r = _call_openrouter(prompt)
-        elif provider == "ollama":
-            r = _call_ollama(prompt)
-        elif provider == "mock":
-            r = _call_mock(prompt)
-        else:
-            raise RuntimeError(f"Unknown LLM_PROVIDER='{provider}'. Use openai|anthropic|openrouter|ollama|mock.")
-    except HTTPError as e:
-        try:
-            body = e.read().decode("utf-8", errors="ignore")
-        except Exception:
-            body = ""
-        return {
-            "text": f"[LLM ERROR] HTTP {getattr(e, 'code', '?')} from provider '{provider}'.\n{body}",
-            "input_tokens": None,
-            "output_tokens": None,
-            "time_s": 0.0,
-        }
-    except URLError as e:
-        return {
-            "text": f"[LLM ERROR] Network error calling provider '{provider}': {e}",
-            "input_tokens": None,
-            "output_tokens": None,
-            "time_s": 0.0,
-        }
-    except Exception as e:
-        return {
-            "text": f"[LLM ERROR] {e}",
-            "input_tokens": None,
-            "output_tokens": None,
-            "time_s": 0.0,
-        }
-
-    return {
-        "text": r.text,
-        "input_tokens": r.input_tokens,
-        "output_tokens": r.output_tokens,
-        "time_s": r.time_s,
-    }
+"""
+LLM Client for Awakened Wisdom Demo
+
+This file is designed so that demo runners NEVER have to edit it.
+
+Configuration comes from:
+- backend/.env   (simple text file next to this file)
+- or real environment variables
+
+Supported providers via LLM_PROVIDER:
+- openai     (OpenAI Responses API)
+- anthropic  (Anthropic Messages API)
+- openrouter (OpenRouter chat completions)
+- ollama     (local LLM via Ollama)
+- mock       (default; uses precomputed answers in the backend)
+
+Expected return format (used by ads_demo_api):
+{
+    "text": str,
+    "input_tokens": int | None,
+    "output_tokens": int | None,
+    "time_s": float,
+    "time_net_s": float,   # portion of time_s spent on the network call
+    "time_parse_s": float  # portion of time_s spent parsing the body
+}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.error import URLError, HTTPError
+
+# Optional pooled async HTTP client. Without httpx the blocking urllib
+# path still works — it just runs in a worker thread.
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None  # type: ignore[assignment]
+    HTTPX_AVAILABLE = False
+
+# Optional SIMD JSON encoding for request payloads (stdlib fallback)
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# Optional SIMD-accelerated hashing for cache keys (blake2b fallback)
+try:
+    import blake3
+except ImportError:
+    blake3 = None  # type: ignore[assignment]
+
+# Optional Redis backing for the response cache (multi-worker deploys);
+# enabled by setting ADS_CACHE_URL=redis://...
+try:
+    import redis.asyncio as aioredis
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+# ---------------------------------------------------------------------------
+# Simple .env loader (backend/.env only, no guessing)
+# ---------------------------------------------------------------------------
+
+def _load_backend_env() -> None:
+    """Load key=value pairs from backend/.env into os.environ (if set)."""
+    env_path = Path(__file__).resolve().parent / ".env"
+    # One read + split instead of a stat() probe plus buffered line
+    # iteration; a missing file is the common case and costs one syscall.
+    try:
+        raw = env_path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        print("[ADS DEMO] No backend/.env found – using environment variables or mock mode")
+        return
+    except Exception as e:
+        print(f"[ADS DEMO] Warning: failed to read backend/.env: {e}")
+        return
+
+    print(f"[ADS DEMO] Loading backend/.env from {env_path}")
+    try:
+        for line in raw.split("\n"):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" not in line:
+                continue
+            k, v = line.split("=", 1)
+            k = k.strip()
+            v = v.strip().strip('"').strip("'")
+            # Do not override real env vars
+            if k and (k not in os.environ):
+                os.environ[k] = v
+    except Exception as e:
+        print(f"[ADS DEMO] Warning: failed to parse backend/.env: {e}")
+
+
+# Deferred until the first config read (app startup) rather than module
+# import, so importing llm_client costs nothing.
+_ENV_LOADED = False
+
+
+def _ensure_env_loaded() -> None:
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        _ENV_LOADED = True
+        _load_backend_env()
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _env(name: str, default: Optional[str] = None) -> Optional[str]:
+    _ensure_env_loaded()
+    v = os.environ.get(name)
+    if v is None or v == "":
+        return default
+    return v
+
+
+@dataclass
+class LLMResult:
+    text: str
+    input_tokens: Optional[int]
+    output_tokens: Optional[int]
+    time_s: float
+    # Split of time_s: time on the wire vs parsing the response body.
+    time_net_s: float = 0.0
+    time_parse_s: float = 0.0
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """Process-constant LLM knobs, resolved from the env exactly once."""
+    provider: str
+    model: str  # empty -> provider-specific default
+    temperature: float
+    max_tokens: int
+    system: str
+
+
+@lru_cache(maxsize=1)
+def _config() -> ProviderConfig:
+    cfg = ProviderConfig(
+        provider=(_env("LLM_PROVIDER", "mock") or "mock").strip().lower(),
+        model=_env("LLM_MODEL", "") or "",
+        temperature=float(_env("LLM_TEMPERATURE", "0.2")),
+        max_tokens=int(_env("LLM_MAX_OUTPUT_TOKENS", "900")),
+        system=_env("LLM_SYSTEM", "") or "",
+    )
+    print(f"[ADS DEMO] LLM_PROVIDER resolved to '{cfg.provider}'")
+    return cfg
+
+
+@dataclass(frozen=True)
+class EndpointConfig:
+    """Per-provider endpoint knobs (key + URL), resolved from env once."""
+    api_key: Optional[str]
+    url: str
+
+
+def _require_key(env_name: str) -> str:
+    key = _env(env_name)
+    if not key:
+        raise RuntimeError(f"Missing {env_name} in backend/.env or environment.")
+    return key
+
+
+@lru_cache(maxsize=None)
+def _endpoint(provider: str) -> EndpointConfig:
+    # Key presence is validated here, on the first call for a provider —
+    # the hot-path _call_* functions rely on it and skip their own checks.
+    # (Ollama is local and keyless.)
+    if provider == "openai":
+        return EndpointConfig(
+            api_key=_require_key("OPENAI_API_KEY"),
+            url=_env("OPENAI_BASE_URL", "https://api.openai.com/v1/responses"),
+        )
+    if provider == "anthropic":
+        return EndpointConfig(
+            api_key=_require_key("ANTHROPIC_API_KEY"),
+            url=_env("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1/messages"),
+        )
+    if provider == "openrouter":
+        return EndpointConfig(
+            api_key=_require_key("OPENROUTER_API_KEY"),
+            url=_env("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions"),
+        )
+    if provider == "ollama":
+        base_url = _env("OLLAMA_BASE_URL", "http://localhost:11434")
+        return EndpointConfig(api_key=None, url=base_url.rstrip("/") + "/api/chat")
+    raise RuntimeError(f"Unknown provider '{provider}' for endpoint config.")
+
+
+@lru_cache(maxsize=None)
+def _request_template(provider: str) -> Any:
+    """
+    Static request pieces for a provider, built once: the headers dict, the
+    payload skeleton, and (for chat-style APIs) the leading system message.
+    The hot path only has to splice the prompt in.
+    """
+    cfg = _config()
+    ep = _endpoint(provider)
+    if provider == "openai":
+        headers = {"Authorization": f"Bearer {ep.api_key}"}
+        payload: Dict[str, Any] = {
+            "model": cfg.model or "gpt-4o",
+            "temperature": cfg.temperature,
+            "max_output_tokens": cfg.max_tokens,
+        }
+        if cfg.system:
+            payload["instructions"] = cfg.system
+        return headers, payload, ()
+    if provider == "anthropic":
+        headers = {
+            "x-api-key": ep.api_key,
+            "anthropic-version": _env("ANTHROPIC_VERSION", "2023-06-01"),
+        }
+        payload = {
+            "model": cfg.model or "claude-3-5-sonnet-latest",
+            "max_tokens": cfg.max_tokens,
+            "temperature": cfg.temperature,
+        }
+        if cfg.system:
+            payload["system"] = cfg.system
+        return headers, payload, ()
+    if provider == "openrouter":
+        headers = {"Authorization": f"Bearer {ep.api_key}"}
+        payload = {
+            "model": cfg.model or "openai/gpt-4o-mini",
+            "temperature": cfg.temperature,
+            "max_tokens": cfg.max_tokens,
+        }
+        prefix = ({"role": "system", "content": cfg.system},) if cfg.system else ()
+        return headers, payload, prefix
+    if provider == "ollama":
+        payload = {
+            "model": cfg.model or "llama3.1",
+            "stream": False,
+            "options": {"temperature": cfg.temperature},
+        }
+        prefix = ({"role": "system", "content": cfg.system},) if cfg.system else ()
+        return {}, payload, prefix
+    raise RuntimeError(f"Unknown provider '{provider}' for request template.")
+
+
+def reload_config() -> None:
+    """Drop cached config so tests can change env vars mid-process."""
+    _config.cache_clear()
+    _endpoint.cache_clear()
+    _request_template.cache_clear()
+
+
+def _json_dumps_bytes(payload: Dict[str, Any]) -> bytes:
+    """
+    Encode a request payload straight to bytes (orjson when installed).
+
+    Keys are sorted so identical payloads serialize to identical bytes
+    regardless of dict build order — provider prompt caches key on the
+    exact request bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, sort_keys=True).encode("utf-8")
+
+
+def _json_loads_bytes(data: bytes) -> Dict[str, Any]:
+    """Parse a response body from raw bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Set by the sync generate_response wrapper: its asyncio.run spins up a
+# throwaway event loop per call, so a per-loop AsyncClient would never be
+# reused there. Requests made in sync mode go through the pooled sync
+# client in a worker thread instead.
+_SYNC_MODE: "contextvars.ContextVar[bool]" = contextvars.ContextVar("llm_sync_mode", default=False)
+
+
+@lru_cache(maxsize=1)
+def _get_sync_client() -> "httpx.Client":
+    """Pooled sync client: keep-alive amortizes the TCP+TLS handshake."""
+    import atexit
+
+    limits = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    try:
+        client = httpx.Client(http2=True, timeout=90.0, limits=limits)
+    except ImportError:  # http2 extra (h2) not installed
+        client = httpx.Client(timeout=90.0, limits=limits)
+    atexit.register(client.close)
+    return client
+
+
+def _post_json(
+    url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout_s: int = 90
+) -> "Tuple[Dict[str, Any], float, float]":
+    """POST and parse; returns (data, net_seconds, parse_seconds)."""
+    data = _json_dumps_bytes(payload)
+    t0 = time.perf_counter_ns()
+    if HTTPX_AVAILABLE:
+        resp = _get_sync_client().post(
+            url,
+            headers={**headers, "Content-Type": "application/json"},
+            content=data,
+            timeout=timeout_s,
+        )
+        resp.raise_for_status()
+        body = resp.content
+    else:
+        # stdlib fallback: one fresh connection per call (urllib imported
+        # here so cold-start never pays for it on the httpx path)
+        from urllib.request import Request, urlopen
+
+        req = Request(url, data=data, headers={**headers, "Content-Type": "application/json"}, method="POST")
+        with urlopen(req, timeout=timeout_s) as resp:
+            # Hand the raw bytes straight to the parser — the decode-to-str
+            # pass was a second full walk over bodies that can be tens of KB.
+            body = resp.read()
+    t_net = time.perf_counter_ns() - t0
+    parsed = _json_loads_bytes(body)
+    t_parse = time.perf_counter_ns() - t0 - t_net
+    return parsed, t_net / 1e9, t_parse / 1e9
+
+
+# Shared AsyncClient, created lazily per running event loop so the sync
+# compatibility wrapper (asyncio.run) and uvicorn's loop don't fight
+# over one client.
+_ASYNC_CLIENT: Optional["httpx.AsyncClient"] = None
+_ASYNC_CLIENT_LOOP: Any = None
+
+
+async def _aclose_quietly(client: "httpx.AsyncClient") -> None:
+    try:
+        await client.aclose()
+    except Exception:
+        pass
+
+
+def _get_async_client() -> "httpx.AsyncClient":
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT_LOOP is not loop:
+        if _ASYNC_CLIENT is not None:
+            # A client left over from a loop that no longer runs (e.g. a
+            # script calling asyncio.run repeatedly). Close it on the
+            # current loop, best-effort, so its sockets don't leak.
+            asyncio.ensure_future(_aclose_quietly(_ASYNC_CLIENT), loop=loop)
+        limits = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+        try:
+            _ASYNC_CLIENT = httpx.AsyncClient(http2=True, timeout=90.0, limits=limits)
+        except ImportError:  # http2 extra (h2) not installed
+            _ASYNC_CLIENT = httpx.AsyncClient(timeout=90.0, limits=limits)
+        _ASYNC_CLIENT_LOOP = loop
+    return _ASYNC_CLIENT
+
+
+async def aclose_http_client() -> None:
+    """Close the pooled async client (called from app shutdown)."""
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+        _ASYNC_CLIENT = None
+        _ASYNC_CLIENT_LOOP = None
+
+
+async def _post_json_async(
+    url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout_s: int = 90
+) -> "Tuple[Dict[str, Any], float, float]":
+    """Async POST and parse; returns (data, net_seconds, parse_seconds)."""
+    if not HTTPX_AVAILABLE or _SYNC_MODE.get():
+        # Blocking call moved off the event loop: urllib when httpx is
+        # missing, the pooled sync client for the sync wrapper (whose
+        # short-lived loops could never reuse an AsyncClient).
+        return await asyncio.to_thread(_post_json, url, headers, payload, timeout_s)
+    client = _get_async_client()
+    t0 = time.perf_counter_ns()
+    resp = await client.post(
+        url,
+        headers={**headers, "Content-Type": "application/json"},
+        content=_json_dumps_bytes(payload),
+        timeout=timeout_s,
+    )
+    resp.raise_for_status()
+    body = resp.content
+    t_net = time.perf_counter_ns() - t0
+    parsed = _json_loads_bytes(body)
+    t_parse = time.perf_counter_ns() - t0 - t_net
+    return parsed, t_net / 1e9, t_parse / 1e9
+
+
+def _safe_int(x: Any) -> Optional[int]:
+    try:
+        if x is None:
+            return None
+        return int(x)
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Provider calls
+# ---------------------------------------------------------------------------
+
+async def _call_openai(prompt: str) -> LLMResult:
+    ep = _endpoint("openai")  # raises once if OPENAI_API_KEY is missing
+    headers, base_payload, _ = _request_template("openai")
+    payload = {**base_payload, "input": prompt}
+
+    data, t_net, t_parse = await _post_json_async(ep.url, headers, payload)
+
+    # Fast path: the overwhelmingly common shape is a single output item
+    # with a single text block — grab it by known keys instead of walking
+    # every element. The generic walk below covers anything else.
+    text = ""
+    try:
+        output = data["output"]
+        block = output[0]["content"][0]
+        if len(output) == 1 and len(output[0]["content"]) == 1 and block.get("type") in ("output_text", "text"):
+            text = block["text"].strip()
+    except (KeyError, IndexError, TypeError):
+        pass
+    if not text:
+        text_parts = []
+        for item in data.get("output", []) or []:
+            for c in item.get("content", []) or []:
+                if isinstance(c, dict) and c.get("type") in ("output_text", "text") and c.get("text"):
+                    text_parts.append(c["text"])
+        # One fragment is the norm even here; skip the join allocation.
+        if len(text_parts) == 1:
+            text = text_parts[0].strip()
+        else:
+            text = "\n".join(text_parts).strip()
+
+    usage = data.get("usage") or {}
+    input_tokens = _safe_int(usage.get("input_tokens"))
+    output_tokens = _safe_int(usage.get("output_tokens"))
+
+    return LLMResult(
+        text=text or "(No text returned from OpenAI.)",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        time_s=t_net + t_parse,
+        time_net_s=t_net,
+        time_parse_s=t_parse,
+    )
+
+
+# Anthropic only caches prompt prefixes of >=1024 tokens; below that the
+# cache_control marker is dead weight. ~4 chars/token heuristic.
+_ANTHROPIC_CACHE_MIN_CHARS = 4096
+
+
+async def _call_anthropic(prompt: str, stable_prefix: Optional[str] = None) -> LLMResult:
+    ep = _endpoint("anthropic")  # raises once if ANTHROPIC_API_KEY is missing
+    headers, base_payload, _ = _request_template("anthropic")
+    # When the caller marks a stable prefix (preamble + wisdom nodes that
+    # repeat across a session), send it as its own content block with
+    # cache_control so the provider serves it from its KV cache — repeat
+    # questions then only pay input tokens for the tail.
+    content: Any = prompt
+    if (
+        stable_prefix
+        and len(stable_prefix) >= _ANTHROPIC_CACHE_MIN_CHARS
+        and prompt.startswith(stable_prefix)
+    ):
+        content = [
+            {"type": "text", "text": stable_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt[len(stable_prefix):]},
+        ]
+    payload = {**base_payload, "messages": [{"role": "user", "content": content}]}
+
+    data, t_net, t_parse = await _post_json_async(ep.url, headers, payload)
+
+    # Fast path: a non-tool-use reply is one text block; skip the walk.
+    text = ""
+    try:
+        content = data["content"]
+        if len(content) == 1 and content[0].get("type") == "text":
+            text = content[0]["text"].strip()
+    except (KeyError, IndexError, TypeError):
+        pass
+    if not text:
+        text_parts = []
+        for c in data.get("content", []) or []:
+            if isinstance(c, dict) and c.get("type") == "text" and c.get("text"):
+                text_parts.append(c["text"])
+        if len(text_parts) == 1:
+            text = text_parts[0].strip()
+        else:
+            text = "\n".join(text_parts).strip()
+
+    usage = data.get("usage") or {}
+    input_tokens = _safe_int(usage.get("input_tokens"))
+    output_tokens = _safe_int(usage.get("output_tokens"))
+
+    return LLMResult(
+        text=text or "(No text returned from Anthropic.)",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        time_s=t_net + t_parse,
+        time_net_s=t_net,
+        time_parse_s=t_parse,
+    )
+
+
+async def _call_openrouter(prompt: str) -> LLMResult:
+    ep = _endpoint("openrouter")  # raises once if OPENROUTER_API_KEY is missing
+    headers, base_payload, msg_prefix = _request_template("openrouter")
+    payload = {**base_payload, "messages": [*msg_prefix, {"role": "user", "content": prompt}]}
+
+    data, t_net, t_parse = await _post_json_async(ep.url, headers, payload)
+
+    text = ""
+    try:
+        text = (data.get("choices") or [])[0]["message"]["content"]
+    except Exception:
+        text = ""
+
+    usage = data.get("usage") or {}
+    input_tokens = _safe_int(usage.get("prompt_tokens"))
+    output_tokens = _safe_int(usage.get("completion_tokens"))
+
+    return LLMResult(
+        text=text or "(No text returned from OpenRouter.)",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        time_s=t_net + t_parse,
+        time_net_s=t_net,
+        time_parse_s=t_parse,
+    )
+
+
+async def _call_ollama(prompt: str) -> LLMResult:
+    headers, base_payload, msg_prefix = _request_template("ollama")
+    payload = {**base_payload, "messages": [*msg_prefix, {"role": "user", "content": prompt}]}
+
+    data, t_net, t_parse = await _post_json_async(_endpoint("ollama").url, headers, payload, timeout_s=180)
+
+    text = ""
+    try:
+        text = (data.get("message") or {}).get("content", "")
+    except Exception:
+        text = ""
+
+    input_tokens = _safe_int(data.get("prompt_eval_count"))
+    output_tokens = _safe_int(data.get("eval_count"))
+
+    return LLMResult(
+        text=text or "(No text returned from Ollama.)",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        time_s=t_net + t_parse,
+        time_net_s=t_net,
+        time_parse_s=t_parse,
+    )
+
+
+def _call_mock(prompt: str) -> LLMResult:
+    t0 = time.perf_counter()
+    text = (
+        "MOCK MODE is enabled (LLM_PROVIDER=mock or missing).\n\n"
+        "To make this demo fully interactive, set LLM_PROVIDER + an API key in backend/.env.\n"
+        "Example:\n"
+        "  LLM_PROVIDER=openai\n"
+        "  OPENAI_API_KEY=sk-...\n"
+        "  LLM_MODEL=gpt-4o\n\n"
+        f"Prompt received (first 500 chars):\n{prompt[:500]}"
+    )
+    dt = time.perf_counter() - t0
+    return LLMResult(text=text, input_tokens=None, output_tokens=None, time_s=dt)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+__all__ = [
+    "LLMResult",
+    "aclose_http_client",
+    "generate_many",
+    "generate_response",
+    "generate_response_async",
+    "is_mock_provider",
+    "reload_config",
+]
+
+
+def is_mock_provider() -> bool:
+    """Helper used by ads_demo_api to decide if we should use precomputed answers."""
+    return _config().provider == "mock"
+
+
+# Provider name -> async call, replacing a per-request if/elif chain.
+# Mock stays outside the table: it is sync and never cached.
+_DISPATCH = {
+    "openai": _call_openai,
+    "anthropic": _call_anthropic,
+    "openrouter": _call_openrouter,
+    "ollama": _call_ollama,
+}
+
+
+# ---------------------------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------------------------
+
+# Identical prompts recur constantly during live demos; a hit trades a
+# dict lookup (or one Redis GET) for a full provider round-trip + token
+# cost. Bounded FIFO so a long session can't grow it unbounded.
+_LLM_CACHE: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+_LLM_CACHE_MAX = 256
+_LLM_CACHE_TTL_S = 3600
+
+_REDIS: Any = None
+
+
+def _cache_enabled(cfg: ProviderConfig) -> bool:
+    """
+    Caching is only sound for deterministic requests: at temperature > 0
+    the provider legitimately returns different answers for the same
+    prompt, and pinning the first one would misrepresent the model.
+    LLM_CACHE_DISABLE=1 turns the cache off entirely.
+    """
+    if _env("LLM_CACHE_DISABLE") == "1":
+        return False
+    return cfg.temperature == 0.0
+
+
+def _cache_key(cfg: ProviderConfig, prompt: str) -> bytes:
+    # Every knob that changes the response is part of the key. blake3
+    # hashes its 64-byte chunks with SIMD, which matters for multi-KB
+    # ADS prompts; blake2b is the stdlib fallback. Keys stay raw bytes —
+    # hex strings would double the cache dict's key memory.
+    h = blake3.blake3() if blake3 is not None else hashlib.blake2b(digest_size=16)
+    h.update(
+        f"{cfg.provider}||{cfg.model}||{cfg.temperature}||{cfg.max_tokens}||{cfg.system}||".encode("utf-8")
+    )
+    h.update(prompt.encode("utf-8"))
+    return h.digest()[:16]
+
+
+# Disk tier: the in-memory cache dies with the process, so a demo rerun
+# re-pays every provider call. A small sqlite3 file (stdlib, WAL mode for
+# concurrent readers) keeps warm responses across restarts.
+_DB: Any = None
+_DB_UNAVAILABLE = False
+
+
+def _get_db() -> Any:
+    global _DB, _DB_UNAVAILABLE
+    if _DB is not None or _DB_UNAVAILABLE:
+        return _DB
+    if _env("LLM_DISK_CACHE_DISABLE") == "1":
+        _DB_UNAVAILABLE = True
+        return None
+    import sqlite3
+
+    try:
+        cache_dir = Path(os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))) / "awakened_wisdom"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(cache_dir / "llm_cache.sqlite3"), check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS cache(key BLOB PRIMARY KEY, body BLOB, in_tok INT, out_tok INT, ts REAL)"
+        )
+        # Prune expired rows once per process, not per lookup.
+        ttl_s = float(_env("LLM_CACHE_TTL_DAYS", "7")) * 86400
+        db.execute("DELETE FROM cache WHERE ts < ?", (time.time() - ttl_s,))
+        db.commit()
+        _DB = db
+    except Exception as e:
+        print(f"[ADS DEMO] Warning: disk cache unavailable: {e}")
+        _DB_UNAVAILABLE = True
+    return _DB
+
+
+# Blocking sqlite helpers: the async cache wrappers run these through
+# asyncio.to_thread so the SELECT / commit fsync never stall the loop.
+
+def _db_get(key: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        row = _get_db().execute(
+            "SELECT body, in_tok, out_tok FROM cache WHERE key=?", (key,)
+        ).fetchone()
+    except Exception as e:
+        print(f"[ADS DEMO] Warning: disk cache read failed: {e}")
+        return None
+    if row is None:
+        return None
+    return {
+        "text": row[0].decode("utf-8"),
+        "input_tokens": row[1],
+        "output_tokens": row[2],
+        "time_s": 0.0,
+        "time_net_s": 0.0,
+        "time_parse_s": 0.0,
+    }
+
+
+def _db_put(key: bytes, result: Dict[str, Any]) -> None:
+    try:
+        db = _get_db()
+        db.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            (
+                key,
+                result["text"].encode("utf-8"),
+                result.get("input_tokens"),
+                result.get("output_tokens"),
+                time.time(),
+            ),
+        )
+        db.commit()
+    except Exception as e:
+        print(f"[ADS DEMO] Warning: disk cache write failed: {e}")
+
+
+def _get_redis() -> Any:
+    global _REDIS
+    url = _env("ADS_CACHE_URL")
+    if not (REDIS_AVAILABLE and url):
+        return None
+    if _REDIS is None:
+        _REDIS = aioredis.from_url(url)
+    return _REDIS
+
+
+async def _cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    hit = _LLM_CACHE.get(key)
+    if hit is not None:
+        return dict(hit)
+    if _get_db() is not None:
+        hit = await asyncio.to_thread(_db_get, key)
+        if hit is not None:
+            return hit
+    r = _get_redis()
+    if r is not None:
+        try:
+            raw = await r.get(key)
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            print(f"[ADS DEMO] Warning: Redis cache read failed: {e}")
+    return None
+
+
+async def _cache_put(key: bytes, result: Dict[str, Any]) -> None:
+    _LLM_CACHE[key] = dict(result)
+    while len(_LLM_CACHE) > _LLM_CACHE_MAX:
+        _LLM_CACHE.popitem(last=False)
+    if _get_db() is not None:
+        await asyncio.to_thread(_db_put, key, result)
+    r = _get_redis()
+    if r is not None:
+        try:
+            await r.set(key, json.dumps(result), ex=_LLM_CACHE_TTL_S)
+        except Exception as e:
+            print(f"[ADS DEMO] Warning: Redis cache write failed: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Semantic cache (opt-in)
+# ---------------------------------------------------------------------------
+
+# Near-duplicate cache: the exact-match cache misses whenever a user
+# rephrases a question, but for a demo corpus the rephrasings cluster
+# tightly in embedding space. Opt-in via LLM_SEMCACHE=1 because serving
+# a stored answer for a *similar* prompt is an approximation; it also
+# needs the optional embedding stack (see embeddings.py).
+_SEM_CACHE_MAX = 256
+_SEM_CACHE_THRESHOLD = 0.92
+
+_SEM_VECS: Any = None  # float32 (N, d), rows L2-normalized
+_SEM_RESULTS: List[Dict[str, Any]] = []
+
+
+def _sem_enabled(cfg: ProviderConfig) -> bool:
+    return _env("LLM_SEMCACHE") == "1" and _cache_enabled(cfg)
+
+
+def _sem_embed(prompt: str) -> Any:
+    try:
+        import embeddings
+    except ImportError:
+        return None
+    return embeddings.embed_query(prompt)
+
+
+def _sem_get(q_vec: Any) -> Optional[Dict[str, Any]]:
+    if q_vec is None or _SEM_VECS is None or not _SEM_RESULTS:
+        return None
+    # Rows and query are normalized, so one matvec gives cosines.
+    scores = _SEM_VECS @ q_vec[0]
+    i = int(scores.argmax())
+    if float(scores[i]) >= _SEM_CACHE_THRESHOLD:
+        return dict(_SEM_RESULTS[i])
+    return None
+
+
+def _sem_put(q_vec: Any, result: Dict[str, Any]) -> None:
+    global _SEM_VECS
+    if q_vec is None:
+        return
+    import numpy as np  # embeddings produced q_vec, so numpy is present
+
+    if _SEM_VECS is None:
+        _SEM_VECS = q_vec.copy()
+        _SEM_RESULTS.append(dict(result))
+        return
+    _SEM_VECS = np.vstack((_SEM_VECS, q_vec))
+    _SEM_RESULTS.append(dict(result))
+    if len(_SEM_RESULTS) > _SEM_CACHE_MAX:
+        _SEM_VECS = _SEM_VECS[1:]
+        _SEM_RESULTS.pop(0)
+
+
+def _error_result(text: str) -> Dict[str, Any]:
+    return {
+        "text": text,
+        "input_tokens": None,
+        "output_tokens": None,
+        "time_s": 0.0,
+        "time_net_s": 0.0,
+        "time_parse_s": 0.0,
+    }
+
+
+async def generate_response_async(
+    prompt: str, stable_prefix: Optional[str] = None, **_kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Called by the demo backend.
+
+    stable_prefix marks the leading portion of the prompt that repeats
+    across requests; providers with prompt caching (Anthropic) use it,
+    the rest ignore it.
+
+    Returns a dict with:
+    - text
+    - input_tokens
+    - output_tokens
+    - time_s
+    """
+    cfg = _config()
+    provider = cfg.provider
+    print(f"[ADS DEMO] generate_response using provider='{provider}'")
+
+    # Mock answers are free; only deterministic real-provider requests
+    # are worth (and safe) caching.
+    key: Optional[bytes] = None
+    if provider != "mock" and _cache_enabled(cfg):
+        key = _cache_key(cfg, prompt)
+        hit = await _cache_get(key)
+        if hit is not None:
+            hit["time_s"] = 0.0
+            hit["cached"] = True
+            return hit
+
+    # Exact match missed — a rephrased question may still be close
+    # enough in embedding space to serve from the semantic cache.
+    sem_vec: Any = None
+    if provider != "mock" and _sem_enabled(cfg):
+        sem_vec = _sem_embed(prompt)
+        sem_hit = _sem_get(sem_vec)
+        if sem_hit is not None:
+            sem_hit["time_s"] = 0.0
+            sem_hit["cached"] = True
+            return sem_hit
+
+    try:
+        if provider == "mock":
+            r = _call_mock(prompt)
+        else:
+            call = _DISPATCH.get(provider)
+            if call is None:
+                raise RuntimeError(f"Unknown LLM_PROVIDER='{provider}'. Use openai|anthropic|openrouter|ollama|mock.")
+            if call is _call_anthropic:
+                r = await call(prompt, stable_prefix=stable_prefix)
+            else:
+                r = await call(prompt)
+    except HTTPError as e:
+        try:
+            body = e.read().decode("utf-8", errors="ignore")
+        except Exception:
+            body = ""
+        return _error_result(f"[LLM ERROR] HTTP {getattr(e, 'code', '?')} from provider '{provider}'.\n{body}")
+    except URLError as e:
+        return _error_result(f"[LLM ERROR] Network error calling provider '{provider}': {e}")
+    except Exception as e:
+        if HTTPX_AVAILABLE and isinstance(e, httpx.HTTPStatusError):
+            return _error_result(
+                f"[LLM ERROR] HTTP {e.response.status_code} from provider '{provider}'.\n{e.response.text}"
+            )
+        if HTTPX_AVAILABLE and isinstance(e, httpx.TransportError):
+            return _error_result(f"[LLM ERROR] Network error calling provider '{provider}': {e}")
+        return _error_result(f"[LLM ERROR] {e}")
+
+    result = {
+        "text": r.text,
+        "input_tokens": r.input_tokens,
+        "output_tokens": r.output_tokens,
+        "time_s": r.time_s,
+        "time_net_s": r.time_net_s,
+        "time_parse_s": r.time_parse_s,
+    }
+    if key is not None:
+        await _cache_put(key, result)
+    if sem_vec is not None:
+        _sem_put(sem_vec, result)
+    return result
+
+
+def generate_response(prompt: str, **_kwargs: Any) -> Dict[str, Any]:
+    """Synchronous wrapper around generate_response_async (scripts/tools)."""
+    token = _SYNC_MODE.set(True)
+    try:
+        return asyncio.run(generate_response_async(prompt, **_kwargs))
+    finally:
+        _SYNC_MODE.reset(token)
+
+
+async def generate_many(prompts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Fan out several prompts concurrently, preserving input order.
+
+    Concurrency is capped by LLM_CONCURRENCY (default 8) so a batch of
+    prompts overlaps network waits without tripping provider rate limits.
+    """
+    sem = asyncio.Semaphore(int(_env("LLM_CONCURRENCY", "8")))
+
+    async def _one(p: str) -> Dict[str, Any]:
+        async with sem:
+            return await generate_response_async(p)
+
+    return list(await asyncio.gather(*(_one(p) for p in prompts)))